@@ -1,12 +1,15 @@
 import logging
 import aiohttp
-import json
+import orjson
 import hashlib
 import time
-from urllib.parse import urlencode
+from urllib.parse import urlencode, urlparse
 import asyncio
+from collections import deque
+from typing import Optional
+from cachetools import TTLCache
 
-from config import ALIEXPRESS_APP_KEY, ALIEXPRESS_APP_SECRET, MAX_REQUESTS_PER_MINUTE
+from config import ALIEXPRESS_APP_KEY, ALIEXPRESS_APP_SECRET, MAX_REQUESTS_PER_MINUTE, MAX_CONCURRENT_REQUESTS
 from bot.utils import extract_product_id
 
 # Configure logging
@@ -17,25 +20,102 @@ ALIEXPRESS_API_URL = "https://api.aliexpress.com/rest"
 AE_AFFILIATE_LINK_GENERATE = "aliexpress.affiliate.link.generate"
 AE_DS_PRODUCT_GET = "aliexpress.ds.product.get"
 
-# Rate limiting
-request_timestamps = []
-async def respect_rate_limit():
-    """Ensure we don't exceed the rate limit."""
-    global request_timestamps
-    current_time = time.time()
+# Parameters shared by every API request
+_COMMON_PARAMS = {
+    "app_key": ALIEXPRESS_APP_KEY,
+    "format": "json",
+    "v": "2.0",
+    "sign_method": "md5"
+}
+
+# App secret pre-encoded for request signing
+_SECRET_BYTES = ALIEXPRESS_APP_SECRET.encode()
+
+# Shared HTTP session (reused across requests for connection pooling)
+_session: Optional[aiohttp.ClientSession] = None
+_session_lock = asyncio.Lock()
+
+# Limits parallel requests to the API host, matching the connector's per-host limit
+_api_semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+
+async def get_session():
+    """Get the shared aiohttp session, creating it on first use.
     
-    # Remove timestamps older than 60 seconds
-    request_timestamps = [ts for ts in request_timestamps if current_time - ts < 60]
+    Returns:
+        aiohttp.ClientSession: The shared client session
+    """
+    global _session
+    if _session is None or _session.closed:
+        async with _session_lock:
+            if _session is None or _session.closed:
+                _session = aiohttp.ClientSession(
+                    connector=aiohttp.TCPConnector(limit=20, limit_per_host=MAX_CONCURRENT_REQUESTS, ttl_dns_cache=300)
+                )
+    return _session
+
+async def close_session():
+    """Close the shared aiohttp session if it is open."""
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+# Result caches: prices change often, affiliate links rarely
+product_details_cache = TTLCache(maxsize=10_000, ttl=300)
+affiliate_link_cache = TTLCache(maxsize=10_000, ttl=86400)
+
+# In-flight request tasks, keyed by "method:key", shared by concurrent callers
+_inflight = {}
+
+async def _coalesce(key, func, *args):
+    """Run func(*args) once for all concurrent callers using the same key.
     
-    # If we've hit the limit, wait
-    if len(request_timestamps) >= MAX_REQUESTS_PER_MINUTE:
-        wait_time = 60 - (current_time - request_timestamps[0])
-        if wait_time > 0:
-            logger.warning(f"Rate limit reached. Waiting for {wait_time:.2f} seconds")
-            await asyncio.sleep(wait_time)
+    The work runs in its own task, so cancelling one caller doesn't cancel
+    the request the other callers are waiting on.
     
-    # Add current timestamp
-    request_timestamps.append(time.time())
+    Args:
+        key (str): Key identifying the request
+        func (callable): Coroutine function performing the actual work
+        
+    Returns:
+        The result of func, shared by every caller waiting on the key
+    """
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.create_task(func(*args))
+        _inflight[key] = task
+        task.add_done_callback(lambda done: _finish_inflight(key, done))
+    return await asyncio.shield(task)
+
+def _finish_inflight(key, task):
+    """Forget a finished in-flight task and mark its exception as retrieved."""
+    if _inflight.get(key) is task:
+        del _inflight[key]
+    if not task.cancelled():
+        task.exception()
+
+# Rate limiting
+request_timestamps = deque(maxlen=MAX_REQUESTS_PER_MINUTE)
+_rate_limit_lock = asyncio.Lock()
+
+async def respect_rate_limit():
+    """Ensure we don't exceed the rate limit."""
+    async with _rate_limit_lock:
+        current_time = time.time()
+        
+        # Remove timestamps older than 60 seconds
+        while request_timestamps and current_time - request_timestamps[0] >= 60:
+            request_timestamps.popleft()
+        
+        # If we've hit the limit, wait
+        if len(request_timestamps) >= MAX_REQUESTS_PER_MINUTE:
+            wait_time = 60 - (current_time - request_timestamps[0])
+            if wait_time > 0:
+                logger.warning(f"Rate limit reached. Waiting for {wait_time:.2f} seconds")
+                await asyncio.sleep(wait_time)
+        
+        # Add current timestamp (the deque drops the oldest one when full)
+        request_timestamps.append(time.time())
 
 def generate_signature(params):
     """Generate signature for AliExpress API.
@@ -46,17 +126,16 @@ def generate_signature(params):
     Returns:
         str: The generated signature
     """
-    # Sort parameters alphabetically by key
-    sorted_params = sorted(params.items())
+    # Feed the secret and the alphabetically sorted parameters into the hash
+    # (the signature is a checksum, not a security primitive)
+    md5 = hashlib.md5(usedforsecurity=False)
+    md5.update(_SECRET_BYTES)
+    for key, value in sorted(params.items()):
+        md5.update(key.encode())
+        md5.update(str(value).encode())
+    md5.update(_SECRET_BYTES)
     
-    # Concatenate all parameters
-    concatenated = ALIEXPRESS_APP_SECRET
-    for key, value in sorted_params:
-        concatenated += key + str(value)
-    concatenated += ALIEXPRESS_APP_SECRET
-    
-    # Generate MD5 hash
-    return hashlib.md5(concatenated.encode()).hexdigest().upper()
+    return md5.hexdigest().upper()
 
 async def make_api_request(method, params):
     """Make a request to the AliExpress API.
@@ -71,30 +150,26 @@ async def make_api_request(method, params):
     # Respect rate limits
     await respect_rate_limit()
     
-    # Common parameters
-    common_params = {
-        "app_key": ALIEXPRESS_APP_KEY,
+    # Merge common, per-call and method-specific parameters
+    all_params = {
+        **_COMMON_PARAMS,
         "method": method,
-        "format": "json",
-        "v": "2.0",
-        "sign_method": "md5",
-        "timestamp": str(int(time.time() * 1000))
+        "timestamp": str(int(time.time() * 1000)),
+        **params
     }
     
-    # Merge with method-specific parameters
-    all_params = {**common_params, **params}
-    
     # Generate signature
     all_params["sign"] = generate_signature(all_params)
     
     try:
-        async with aiohttp.ClientSession() as session:
+        session = await get_session()
+        async with _api_semaphore:
             async with session.post(ALIEXPRESS_API_URL, data=all_params) as response:
                 if response.status != 200:
                     logger.error(f"API request failed with status {response.status}: {await response.text()}")
                     return None
                 
-                response_data = await response.json()
+                response_data = orjson.loads(await response.read())
                 
                 # Check for API errors
                 if 'error_response' in response_data:
@@ -122,63 +197,112 @@ async def get_product_details(product_url):
         logger.error(f"Could not extract product ID from URL: {product_url}")
         return None
     
+    products = await get_products_details([product_id])
+    return products.get(product_id)
+
+async def get_products_details(product_ids):
+    """Get details for several products with a single AliExpress API request.
+    
+    Results are cached for a few minutes, and concurrent lookups of the
+    same products share a single API request.
+    
+    Args:
+        product_ids (iterable): The AliExpress product IDs
+        
+    Returns:
+        dict: Product details keyed by product ID, without the products
+        that could not be retrieved
+    """
+    product_ids = list(dict.fromkeys(product_ids))
+    
+    products = {}
+    missing_ids = []
+    for product_id in product_ids:
+        cached = product_details_cache.get(product_id)
+        if cached is not None:
+            products[product_id] = cached
+        else:
+            missing_ids.append(product_id)
+    
+    if missing_ids:
+        key = f"{AE_DS_PRODUCT_GET}:{','.join(missing_ids)}"
+        products.update(await _coalesce(key, _fetch_products_details, tuple(missing_ids)))
+    
+    return products
+
+async def _fetch_products_details(product_ids):
+    """Fetch details for a batch of product IDs from AliExpress API."""
     # Prepare API parameters
     params = {
-        "product_ids": product_id,
+        "product_ids": ",".join(product_ids),
         "ship_to_country": "US",  # Default shipping country
-        "fields": "title,sale_price,original_price,discount,evaluation_rate,target_app_sale_price,target_original_price,ship_to_country,delivery_time,logistics_cost"
+        "fields": "product_id,title,sale_price,original_price,discount,evaluation_rate,target_app_sale_price,target_original_price,ship_to_country,delivery_time,logistics_cost"
     }
     
     # Make API request
     response = await make_api_request(AE_DS_PRODUCT_GET, params)
     if not response:
-        return None
+        return {}
     
     try:
         # Parse response
         result_key = f"{AE_DS_PRODUCT_GET}_response"
         if result_key not in response:
             logger.error(f"Unexpected response format: {response}")
-            return None
+            return {}
         
         result = response[result_key]
         if 'result' not in result or not result['result']:
             logger.error(f"No results in response: {result}")
-            return None
+            return {}
         
-        products = json.loads(result['result'])
+        products = orjson.loads(result['result'])
         if not products or 'products' not in products or not products['products']:
             logger.error(f"No products found: {products}")
-            return None
+            return {}
         
-        product = products['products'][0]
+        details = {}
+        for product in products['products']:
+            if 'product_id' in product:
+                product_id = str(product['product_id'])
+            elif len(product_ids) == 1:
+                product_id = product_ids[0]
+            else:
+                logger.warning(f"Skipping product without an ID in batch response: {product}")
+                continue
+            
+            details[product_id] = _parse_product(product, product_id)
+            product_details_cache[product_id] = details[product_id]
         
-        # Extract relevant information
-        price = float(product.get('target_app_sale_price', {}).get('amount', 0))
-        original_price = float(product.get('target_original_price', {}).get('amount', 0))
-        
-        result = {
-            'title': product.get('title', 'Unknown Product'),
-            'price': price,
-            'product_id': product_id
-        }
-        
-        # Add optional information if available
-        if original_price > 0 and original_price > price:
-            result['original_price'] = original_price
-        
-        if 'evaluation_rate' in product:
-            result['rating'] = float(product['evaluation_rate'])
-        
-        if 'logistics_cost' in product:
-            shipping_cost = float(product.get('logistics_cost', {}).get('amount', 0))
-            result['shipping_cost'] = shipping_cost
-        
-        return result
+        return details
     
     except Exception as e:
         logger.error(f"Error parsing product details: {e}")
-        return None
+        return {}
+
+def _parse_product(product, product_id):
+    """Extract the relevant product information from an API product entry."""
+    price = float(product.get('target_app_sale_price', {}).get('amount', 0))
+    original_price = float(product.get('target_original_price', {}).get('amount', 0))
+    
+    result = {
+        'title': product.get('title', 'Unknown Product'),
+        'price': price,
+        'product_id': product_id
+    }
+    
+    # Add optional information if available
+    if original_price > 0 and original_price > price:
+        result['original_price'] = original_price
+    
+    if 'evaluation_rate' in product:
+        result['rating'] = float(product['evaluation_rate'])
+    
+    if 'logistics_cost' in product:
+        shipping_cost = float(product.get('logistics_cost', {}).get('amount', 0))
+        result['shipping_cost'] = shipping_cost
+    
+    return result
 
 async def convert_to_affiliate_link(product_url):
     """Convert a regular AliExpress link to an affiliate link.
@@ -189,44 +313,96 @@ async def convert_to_affiliate_link(product_url):
     Returns:
         str: The affiliate link, or the original URL if conversion failed
     """
+    affiliate_links = await convert_to_affiliate_links([product_url])
+    return affiliate_links[product_url]
+
+async def convert_to_affiliate_links(product_urls):
+    """Convert several AliExpress links to affiliate links with a single API request.
+    
+    Generated links are cached for a day, and concurrent conversions of
+    the same URLs share a single API request.
+    
+    Args:
+        product_urls (iterable): The AliExpress product URLs
+        
+    Returns:
+        dict: Affiliate links keyed by product URL, with the original URL
+        for links that couldn't be converted
+    """
+    affiliate_links = {}
+    missing_urls = []
+    for product_url in dict.fromkeys(product_urls):
+        # Links from s.click.aliexpress.com are already affiliate-tracked
+        if urlparse(product_url).netloc.endswith("click.aliexpress.com"):
+            affiliate_links[product_url] = product_url
+            continue
+        
+        cached = affiliate_link_cache.get(product_url)
+        if cached is not None:
+            affiliate_links[product_url] = cached
+        else:
+            missing_urls.append(product_url)
+    
+    if missing_urls:
+        key = f"{AE_AFFILIATE_LINK_GENERATE}:{','.join(missing_urls)}"
+        generated = await _coalesce(key, _fetch_affiliate_links, tuple(missing_urls))
+        for product_url in missing_urls:
+            affiliate_links[product_url] = generated.get(product_url, product_url)
+    
+    return affiliate_links
+
+async def _fetch_affiliate_links(product_urls):
+    """Request affiliate links for a batch of product URLs from AliExpress API."""
     # Prepare API parameters
     params = {
         "source": "aliexpress",
         "app_signature": "alibestprice",
         "tracking_id": "alibestprice",
-        "urls": product_url
+        "urls": ",".join(product_urls)
     }
     
     # Make API request
     response = await make_api_request(AE_AFFILIATE_LINK_GENERATE, params)
     if not response:
-        logger.warning(f"Failed to generate affiliate link. Returning original URL: {product_url}")
-        return product_url
+        logger.warning(f"Failed to generate affiliate links. Returning original URLs: {product_urls}")
+        return {}
     
     try:
         # Parse response
         result_key = f"{AE_AFFILIATE_LINK_GENERATE}_response"
         if result_key not in response:
             logger.error(f"Unexpected response format: {response}")
-            return product_url
+            return {}
         
         result = response[result_key]
         if 'result' not in result or not result['result']:
             logger.error(f"No results in response: {result}")
-            return product_url
+            return {}
         
-        links = json.loads(result['result'])
+        links = orjson.loads(result['result'])
         if not links or 'promotion_links' not in links or not links['promotion_links']:
             logger.error(f"No promotion links found: {links}")
-            return product_url
+            return {}
         
-        # Return the first promotion link
-        promotion_link = links['promotion_links'][0].get('promotion_link')
-        if promotion_link:
-            return promotion_link
+        affiliate_links = {}
+        for link in links['promotion_links']:
+            promotion_link = link.get('promotion_link')
+            if not promotion_link:
+                continue
+            
+            if link.get('source_value') in product_urls:
+                product_url = link['source_value']
+            elif len(product_urls) == 1:
+                product_url = product_urls[0]
+            else:
+                logger.warning(f"Skipping promotion link without a source URL in batch response: {link}")
+                continue
+            
+            affiliate_links[product_url] = promotion_link
+            affiliate_link_cache[product_url] = promotion_link
         
-        return product_url
+        return affiliate_links
     
     except Exception as e:
         logger.error(f"Error parsing affiliate link response: {e}")
-        return product_url
+        return {}
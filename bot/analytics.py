@@ -1,18 +1,38 @@
+import asyncio
 import logging
-import json
+import orjson
 import os
+import threading
 import time
 from datetime import datetime, timedelta
-from collections import defaultdict
+from collections import defaultdict, deque
+from typing import NamedTuple
+from sortedcontainers import SortedList
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+class Action(NamedTuple):
+    """A single logged user action."""
+    user_id: int
+    action_type: str
+    timestamp: int
+
 # In-memory storage for analytics
 # In a production environment, this should be replaced with a database
-user_actions = []
+# Only recent actions are kept in memory; the full history is in data/user_actions.jsonl
+MAX_RECENT_ACTIONS = 10_000
+user_actions = deque(maxlen=MAX_RECENT_ACTIONS)
 action_counts = defaultdict(int)
 user_last_active = {}
+# (last active timestamp, user_id) pairs, kept sorted for range counting
+active_by_timestamp = SortedList()
+
+# Actions waiting to be appended to disk by the background writer
+_pending_actions = asyncio.Queue()
+
+# Serializes file writes between writer threads and the final flush on shutdown
+_file_lock = threading.Lock()
 
 def log_user_action(user_id, action_type):
     """Log a user action for analytics.
@@ -24,70 +44,169 @@ def log_user_action(user_id, action_type):
     timestamp = int(time.time())
     
     # Record the action
-    user_actions.append({
-        'user_id': user_id,
-        'action_type': action_type,
-        'timestamp': timestamp
-    })
+    action = Action(user_id, action_type, timestamp)
+    user_actions.append(action)
     
     # Update action counts
     action_counts[action_type] += 1
     
     # Update user last active time
+    previous = user_last_active.get(user_id)
+    if previous is not None:
+        active_by_timestamp.discard((previous, user_id))
+    active_by_timestamp.add((timestamp, user_id))
     user_last_active[user_id] = timestamp
     
-    # Periodically save analytics to file (every 100 actions)
-    if len(user_actions) % 100 == 0:
-        save_analytics_to_file()
+    # Hand the action to the background writer
+    _pending_actions.put_nowait(action)
+
+async def run_analytics_writer():
+    """Persist logged actions in the background until cancelled.
+    
+    Actions are appended to a JSONL file as they arrive, and the aggregate
+    counters are saved every 100 actions. Remaining actions are flushed
+    when the task is cancelled.
+    """
+    unsaved = 0
+    try:
+        while True:
+            actions = [await _pending_actions.get()]
+            actions.extend(_drain_pending_actions())
+            await asyncio.to_thread(_append_actions, actions)
+            
+            # Periodically save aggregates to file (every 100 actions)
+            unsaved += len(actions)
+            if unsaved >= 100:
+                unsaved = 0
+                await save_analytics_to_file()
+    finally:
+        _append_actions(_drain_pending_actions())
+        _write_snapshot(_take_snapshot())
+
+def _drain_pending_actions():
+    """Take all actions currently waiting to be written."""
+    actions = []
+    while not _pending_actions.empty():
+        actions.append(_pending_actions.get_nowait())
+    return actions
 
-def save_analytics_to_file():
-    """Save analytics data to file."""
+def _append_actions(actions):
+    """Append actions to the user actions JSONL file."""
+    if not actions:
+        return
+    
+    try:
+        os.makedirs('data', exist_ok=True)
+        with _file_lock, open('data/user_actions.jsonl', 'ab') as f:
+            f.writelines(orjson.dumps(action._asdict()) + b'\n' for action in actions)
+    except Exception as e:
+        logger.error(f"Failed to save user actions: {e}")
+
+def _take_snapshot():
+    """Copy the aggregate analytics so they can be written off the event loop."""
+    return {
+        'action_counts': dict(action_counts),
+        'user_last_active': dict(user_last_active)
+    }
+
+def _write_snapshot(snapshot):
+    """Write an aggregate analytics snapshot to file."""
     try:
         # Create directory if it doesn't exist
         os.makedirs('data', exist_ok=True)
         
-        # Save user actions
-        with open('data/user_actions.json', 'w') as f:
-            json.dump(user_actions, f)
-        
-        # Save action counts
-        with open('data/action_counts.json', 'w') as f:
-            json.dump(dict(action_counts), f)
-        
-        # Save user last active
-        with open('data/user_last_active.json', 'w') as f:
-            json.dump(user_last_active, f)
+        with _file_lock:
+            # Save action counts
+            with open('data/action_counts.json', 'wb') as f:
+                f.write(orjson.dumps(snapshot['action_counts']))
+            
+            # Save user last active
+            with open('data/user_last_active.json', 'wb') as f:
+                f.write(orjson.dumps(snapshot['user_last_active'], option=orjson.OPT_NON_STR_KEYS))
         
         logger.info("Analytics saved to file")
     except Exception as e:
         logger.error(f"Failed to save analytics: {e}")
 
+async def save_analytics_to_file():
+    """Save aggregate analytics data to file without blocking the event loop."""
+    await asyncio.to_thread(_write_snapshot, _take_snapshot())
+
+def _read_actions(path):
+    """Yield the actions stored in a JSONL file, skipping lines that don't decode."""
+    with open(path, 'rb') as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                yield Action(**orjson.loads(line))
+            except Exception as e:
+                logger.warning(f"Skipping unreadable line {line_number} in {path}: {e}")
+
+def _terminate_partial_line(path):
+    """End a line left unfinished by an interrupted append, so new actions start on a fresh line."""
+    with _file_lock, open(path, 'rb+') as f:
+        f.seek(0, os.SEEK_END)
+        if f.tell() == 0:
+            return
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) != b'\n':
+            f.write(b'\n')
+
+def _migrate_legacy_actions():
+    """Move user actions saved in the old data/user_actions.json into the JSONL file."""
+    if not os.path.exists('data/user_actions.json') or os.path.exists('data/user_actions.jsonl'):
+        return
+    
+    try:
+        with open('data/user_actions.json', 'rb') as f:
+            actions = [Action(**action) for action in orjson.loads(f.read())]
+        with _file_lock, open('data/user_actions.jsonl', 'wb') as f:
+            f.writelines(orjson.dumps(action._asdict()) + b'\n' for action in actions)
+        os.replace('data/user_actions.json', 'data/user_actions.json.migrated')
+        logger.info(f"Migrated {len(actions)} user actions to data/user_actions.jsonl")
+    except Exception as e:
+        logger.error(f"Failed to migrate user actions: {e}")
+
 def load_analytics_from_file():
-    """Load analytics data from file."""
-    global user_actions, action_counts, user_last_active
+    """Load analytics data from file.
+    
+    Each file is loaded independently, so a damaged file doesn't prevent
+    the others from loading.
+    """
+    global user_actions, action_counts, user_last_active, active_by_timestamp
     
+    _migrate_legacy_actions()
+    
+    # Load user actions
+    try:
+        if os.path.exists('data/user_actions.jsonl'):
+            _terminate_partial_line('data/user_actions.jsonl')
+            user_actions = deque(_read_actions('data/user_actions.jsonl'), maxlen=MAX_RECENT_ACTIONS)
+    except Exception as e:
+        logger.error(f"Failed to load user actions: {e}")
+    
+    # Load action counts
     try:
-        # Load user actions
-        if os.path.exists('data/user_actions.json'):
-            with open('data/user_actions.json', 'r') as f:
-                user_actions = json.load(f)
-        
-        # Load action counts
         if os.path.exists('data/action_counts.json'):
-            with open('data/action_counts.json', 'r') as f:
-                counts = json.load(f)
+            with open('data/action_counts.json', 'rb') as f:
+                counts = orjson.loads(f.read())
                 action_counts = defaultdict(int, counts)
-        
-        # Load user last active
+    except Exception as e:
+        logger.error(f"Failed to load action counts: {e}")
+    
+    # Load user last active
+    try:
         if os.path.exists('data/user_last_active.json'):
-            with open('data/user_last_active.json', 'r') as f:
-                user_last_active = json.load(f)
+            with open('data/user_last_active.json', 'rb') as f:
+                last_active = orjson.loads(f.read())
                 # Convert string keys back to integers
-                user_last_active = {int(k): v for k, v in user_last_active.items()}
-        
-        logger.info("Analytics loaded from file")
+                user_last_active = {int(k): v for k, v in last_active.items()}
+                active_by_timestamp = SortedList((ts, user_id) for user_id, ts in user_last_active.items())
     except Exception as e:
-        logger.error(f"Failed to load analytics: {e}")
+        logger.error(f"Failed to load user last active times: {e}")
+    
+    logger.info("Analytics loaded from file")
 
 def get_statistics():
     """Get bot usage statistics.
@@ -103,8 +222,8 @@ def get_statistics():
     total_users = len(user_last_active)
     
     # Count active users
-    active_today = sum(1 for timestamp in user_last_active.values() if timestamp >= day_ago)
-    active_this_week = sum(1 for timestamp in user_last_active.values() if timestamp >= week_ago)
+    active_today = len(active_by_timestamp) - active_by_timestamp.bisect_left((day_ago,))
+    active_this_week = len(active_by_timestamp) - active_by_timestamp.bisect_left((week_ago,))
     
     # Count requests and conversions
     total_requests = action_counts.get('message_received', 0)
@@ -7,9 +7,9 @@ from aiogram.filters.exception import ExceptionTypeFilter
 from aiogram.exceptions import TelegramAPIError
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
-from config import ADMIN_USER_IDS
-from bot.utils import extract_aliexpress_links, is_valid_aliexpress_link
-from bot.aliexpress import get_product_details, convert_to_affiliate_link
+from config import ADMIN_USER_IDS, MAX_LINKS_PER_MESSAGE
+from bot.utils import extract_aliexpress_links, extract_product_id
+from bot.aliexpress import get_products_details, convert_to_affiliate_links
 from bot.analytics import log_user_action, get_statistics
 
 # Configure logging
@@ -87,27 +87,22 @@ async def process_message(message: Message):
         )
         return
     
-    # Process the first valid link
-    for link in links:
-        if is_valid_aliexpress_link(link):
-            await process_aliexpress_link(message, link)
-            break
-    else:
-        await message.answer(
-            "⚠️ The link you sent doesn't appear to be a valid AliExpress product link.\n\n"
-            "Please check the link and try again."
-        )
+    # Every extracted link matches a link pattern, so process them directly
+    await process_aliexpress_links(message, links[:MAX_LINKS_PER_MESSAGE])
 
-async def process_aliexpress_link(message: Message, link: str):
-    """Process a valid AliExpress link."""
+async def process_aliexpress_links(message: Message, links: list):
+    """Process valid AliExpress links, looking up all products in one request."""
     # Send a processing message
-    processing_msg = await message.answer("🔍 Processing your AliExpress link...")
+    processing_msg = await message.answer(
+        "🔍 Processing your AliExpress link..." if len(links) == 1 else "🔍 Processing your AliExpress links..."
+    )
     
     try:
         # Get product details
-        product = await get_product_details(link)
+        product_ids = {link: extract_product_id(link) for link in links}
+        products = await get_products_details(product_id for product_id in product_ids.values() if product_id)
         
-        if not product:
+        if not products:
             await processing_msg.edit_text(
                 "❌ Sorry, I couldn't retrieve information for this product.\n\n"
                 "This might be due to:\n"
@@ -119,52 +114,75 @@ async def process_aliexpress_link(message: Message, link: str):
             log_user_action(message.from_user.id, "product_not_found")
             return
         
-        # Generate affiliate link
-        affiliate_link = await convert_to_affiliate_link(link)
-        
-        # Build the response
-        response = (
-            f"🛍️ <b>{product['title']}</b>\n\n"
-            f"💰 <b>Current Price:</b> ${product['price']}\n"
-        )
-        
-        if product.get('original_price') and product['original_price'] > product['price']:
-            discount = round(((product['original_price'] - product['price']) / product['original_price']) * 100)
-            response += f"🏷️ <b>Original Price:</b> ${product['original_price']} (Save {discount}%)\n"
-        
-        if product.get('shipping_cost') is not None:
-            if product['shipping_cost'] > 0:
-                response += f"🚚 <b>Shipping:</b> ${product['shipping_cost']}\n"
-            else:
-                response += f"🚚 <b>Shipping:</b> Free\n"
-        
-        if product.get('rating'):
-            response += f"⭐ <b>Rating:</b> {product['rating']}/5\n"
-        
-        response += f"\n🔗 <b>Affiliate Link:</b>\n{affiliate_link}"
-        
-        # Create inline keyboard
-        keyboard = InlineKeyboardBuilder()
-        keyboard.button(text="🛒 Open in AliExpress", url=affiliate_link)
-        
-        # Send the response
-        await processing_msg.edit_text(
-            response,
-            parse_mode="HTML",
-            disable_web_page_preview=False,
-            reply_markup=keyboard.as_markup()
+        # Keep one link per product, and generate all affiliate links in one request
+        unique_links = {}
+        for link, product_id in product_ids.items():
+            unique_links.setdefault(product_id or link, link)
+        affiliate_links = await convert_to_affiliate_links(
+            link for link in unique_links.values() if product_ids[link] in products
         )
         
-        log_user_action(message.from_user.id, "link_processed_successfully")
+        for link in unique_links.values():
+            product_id = product_ids[link]
+            
+            # Reuse the processing message for the first reply
+            send = processing_msg.edit_text if processing_msg else message.answer
+            processing_msg = None
+            
+            product = products.get(product_id)
+            if not product:
+                await send(f"❌ Sorry, I couldn't retrieve information for this product:\n{link}")
+                log_user_action(message.from_user.id, "product_not_found")
+                continue
+            
+            affiliate_link = affiliate_links[link]
+            
+            # Create inline keyboard
+            keyboard = InlineKeyboardBuilder()
+            keyboard.button(text="🛒 Open in AliExpress", url=affiliate_link)
+            
+            # Send the response
+            await send(
+                build_product_message(product, affiliate_link),
+                parse_mode="HTML",
+                disable_web_page_preview=False,
+                reply_markup=keyboard.as_markup()
+            )
+            
+            log_user_action(message.from_user.id, "link_processed_successfully")
         
     except Exception as e:
-        logger.error(f"Error processing link {link}: {e}")
-        await processing_msg.edit_text(
+        logger.error(f"Error processing links {links}: {e}")
+        send = processing_msg.edit_text if processing_msg else message.answer
+        await send(
             "❌ Sorry, something went wrong while processing your link.\n\n"
             "Please try again later or try a different product link."
         )
         log_user_action(message.from_user.id, "error_processing_link")
 
+def build_product_message(product: dict, affiliate_link: str) -> str:
+    """Build the reply text for a product and its affiliate link."""
+    response = (
+        f"🛍️ <b>{product['title']}</b>\n\n"
+        f"💰 <b>Current Price:</b> ${product['price']}\n"
+    )
+    
+    if product.get('original_price') and product['original_price'] > product['price']:
+        discount = round(((product['original_price'] - product['price']) / product['original_price']) * 100)
+        response += f"🏷️ <b>Original Price:</b> ${product['original_price']} (Save {discount}%)\n"
+    
+    if product.get('shipping_cost') is not None:
+        if product['shipping_cost'] > 0:
+            response += f"🚚 <b>Shipping:</b> ${product['shipping_cost']}\n"
+        else:
+            response += f"🚚 <b>Shipping:</b> Free\n"
+    
+    if product.get('rating'):
+        response += f"⭐ <b>Rating:</b> {product['rating']}/5\n"
+    
+    response += f"\n🔗 <b>Affiliate Link:</b>\n{affiliate_link}"
+    return response
+
 # Error handlers
 @router.error(ExceptionTypeFilter(TelegramAPIError))
 async def handle_telegram_api_error(event, error):
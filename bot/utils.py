@@ -13,6 +13,13 @@ ALIEXPRESS_LINK_PATTERNS = [
     r'https?://(?:www\.)?aliexpress\.ru/item/[\d\w]+\.html'
 ]
 
+# All link patterns merged into a single compiled regex
+_COMBINED_RE = re.compile("|".join(f"(?:{p})" for p in ALIEXPRESS_LINK_PATTERNS))
+
+# Product ID in https://www.aliexpress.com/item/1234567890.html on any storefront host
+# (.com, .ru, .us, ...), or in https://www.aliexpress.com/1234/1234567890.html
+_PRODUCT_ID_RE = re.compile(r'https?://[^/?#\s]+/(?:(?:[^?#\s]*/)?item/(?P<item_id>\w+)|\d+/(?P<id>\w+)\.html)')
+
 def extract_aliexpress_links(text):
     """Extract AliExpress product links from text.
     
@@ -25,26 +32,7 @@ def extract_aliexpress_links(text):
     if not text:
         return []
     
-    links = []
-    for pattern in ALIEXPRESS_LINK_PATTERNS:
-        matches = re.findall(pattern, text)
-        links.extend(matches)
-    
-    return links
-
-def is_valid_aliexpress_link(link):
-    """Check if a link is a valid AliExpress product link.
-    
-    Args:
-        link (str): The link to check
-        
-    Returns:
-        bool: True if the link is valid, False otherwise
-    """
-    for pattern in ALIEXPRESS_LINK_PATTERNS:
-        if re.match(pattern, link):
-            return True
-    return False
+    return _COMBINED_RE.findall(text)
 
 def extract_product_id(link):
     """Extract product ID from an AliExpress link.
@@ -55,16 +43,13 @@ def extract_product_id(link):
     Returns:
         str: The product ID, or None if it couldn't be extracted
     """
+    match = _PRODUCT_ID_RE.match(link)
+    if match:
+        return match.group('item_id') or match.group('id')
+    
     try:
-        # Parse the URL
         parsed_url = urlparse(link)
-        
-        # Handle different AliExpress URL formats
-        if 'item' in parsed_url.path:
-            # Format: https://www.aliexpress.com/item/1234567890.html
-            product_id = parsed_url.path.split('/item/')[1].split('.')[0]
-            return product_id
-        elif parsed_url.netloc == 's.click.aliexpress.com':
+        if parsed_url.netloc == 's.click.aliexpress.com':
             # This is a redirected link, we need to follow it to get the actual product ID
             logger.warning("Redirected AliExpress link detected. Product ID extraction might be imprecise.")
             # Try to extract from query parameters
@@ -72,11 +57,6 @@ def extract_product_id(link):
             if 'dl_target_url' in query_params:
                 target_url = query_params['dl_target_url'][0]
                 return extract_product_id(target_url)
-        elif len(parsed_url.path.split('/')) >= 3:
-            # Format: https://www.aliexpress.com/1234/1234567890.html
-            segments = parsed_url.path.strip('/').split('/')
-            if len(segments) >= 2 and segments[1].endswith('.html'):
-                return segments[1].split('.')[0]
         
         logger.warning(f"Could not extract product ID from link: {link}")
         return None
@@ -18,7 +18,11 @@ WEBHOOK_PATH = "/webhook"
 WEBHOOK_URL = f"{BASE_WEBHOOK_URL}{WEBHOOK_PATH}"
 
 # Admin user IDs (for admin commands like /stats)
-ADMIN_USER_IDS = [int(id) for id in os.getenv("ADMIN_USER_IDS", "").split(",") if id]
+ADMIN_USER_IDS = frozenset(int(id) for id in os.getenv("ADMIN_USER_IDS", "").split(",") if id)
 
 # Rate limiting settings
 MAX_REQUESTS_PER_MINUTE = 30
+MAX_CONCURRENT_REQUESTS = 10
+
+# Maximum number of links processed from a single message
+MAX_LINKS_PER_MESSAGE = 5
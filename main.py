@@ -1,9 +1,12 @@
+import asyncio
 import logging
 import os
-from flask import Flask, request, render_template_string, jsonify
+from flask import Flask, Response, request, jsonify
 from aiogram import Bot, Dispatcher
 from config import BOT_TOKEN, WEBHOOK_URL, WEBHOOK_PATH
 from bot.handlers import register_handlers
+from bot.aliexpress import close_session
+from bot.analytics import run_analytics_writer
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -16,9 +19,71 @@ dp = Dispatcher()
 # Register all handlers
 register_handlers(dp)
 
+# Background task persisting analytics to disk
+analytics_writer_task = None
+
+@dp.startup()
+async def on_startup():
+    global analytics_writer_task
+    analytics_writer_task = asyncio.create_task(run_analytics_writer())
+
+# Flush analytics and close the shared AliExpress HTTP session on shutdown
+@dp.shutdown()
+async def on_shutdown():
+    if analytics_writer_task is not None:
+        analytics_writer_task.cancel()
+        try:
+            await analytics_writer_task
+        except asyncio.CancelledError:
+            pass
+    await close_session()
+
 # Initialize Flask application
 app = Flask(__name__)
 
+# Static landing page, built once at import time
+_ROOT_HTML = """
+<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>Ali Best Price Bot</title>
+    <link href="https://cdn.replit.com/agent/bootstrap-agent-dark-theme.min.css" rel="stylesheet">
+    <style>
+        body {
+            display: flex;
+            justify-content: center;
+            align-items: center;
+            min-height: 100vh;
+            background-color: var(--bs-body-bg);
+            color: var(--bs-body-color);
+        }
+        .container {
+            max-width: 600px;
+            padding: 2rem;
+        }
+    </style>
+</head>
+<body data-bs-theme="dark">
+    <div class="container">
+        <div class="card">
+            <div class="card-body">
+                <h1 class="card-title">Ali Best Price Bot</h1>
+                <p class="card-text">This is a Telegram bot that helps you find the best prices on AliExpress and generate affiliate links.</p>
+                <div class="alert alert-success">Server is running!</div>
+                <a href="https://t.me/Ali_Best_Price_bot" class="btn btn-primary">Open Bot in Telegram</a>
+            </div>
+        </div>
+    </div>
+</body>
+</html>
+"""
+
+# Pre-encoded bodies for the constant webhook responses
+_WEBHOOK_OK_BODY = b'{"status":"ok"}'
+_WEBHOOK_INVALID_CONTENT_TYPE_BODY = b'{"status":"error","message":"Invalid content type"}'
+
 # Webhook route for Telegram bot
 @app.route(WEBHOOK_PATH, methods=['POST'])
 def webhook():
@@ -31,54 +96,17 @@ def webhook():
             # Note: Properly we'd use a task queue or async framework
             # But for demo purposes, we'll just log it
             logger.info(f"Received update: {update}")
-            return jsonify({"status": "ok"})
+            return Response(_WEBHOOK_OK_BODY, mimetype="application/json")
         except Exception as e:
             logger.error(f"Error processing update: {e}")
             return jsonify({"status": "error", "message": str(e)})
     
-    return jsonify({"status": "error", "message": "Invalid content type"})
+    return Response(_WEBHOOK_INVALID_CONTENT_TYPE_BODY, mimetype="application/json")
 
 # Default route
 @app.route('/')
 def root():
-    html_content = """
-    <!DOCTYPE html>
-    <html lang="en">
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <title>Ali Best Price Bot</title>
-        <link href="https://cdn.replit.com/agent/bootstrap-agent-dark-theme.min.css" rel="stylesheet">
-        <style>
-            body {
-                display: flex;
-                justify-content: center;
-                align-items: center;
-                min-height: 100vh;
-                background-color: var(--bs-body-bg);
-                color: var(--bs-body-color);
-            }
-            .container {
-                max-width: 600px;
-                padding: 2rem;
-            }
-        </style>
-    </head>
-    <body data-bs-theme="dark">
-        <div class="container">
-            <div class="card">
-                <div class="card-body">
-                    <h1 class="card-title">Ali Best Price Bot</h1>
-                    <p class="card-text">This is a Telegram bot that helps you find the best prices on AliExpress and generate affiliate links.</p>
-                    <div class="alert alert-success">Server is running!</div>
-                    <a href="https://t.me/Ali_Best_Price_bot" class="btn btn-primary">Open Bot in Telegram</a>
-                </div>
-            </div>
-        </div>
-    </body>
-    </html>
-    """
-    return render_template_string(html_content)
+    return _ROOT_HTML
 
 @app.route('/api/status')
 def status():
@@ -87,15 +115,18 @@ def status():
         "bot_name": "Ali Best Price Bot"
     })
 
-@app.before_request
 def log_request_info():
-    logger.info(f"Request: {request.method} {request.path}")
+    logger.debug(f"Request: {request.method} {request.path}")
 
-@app.after_request
 def log_response_info(response):
-    logger.info(f"Response status: {response.status_code}")
+    logger.debug(f"Response status: {response.status_code}")
     return response
 
+# Only log every request/response when debug logging is enabled
+if logger.isEnabledFor(logging.DEBUG):
+    app.before_request(log_request_info)
+    app.after_request(log_response_info)
+
 @app.errorhandler(Exception)
 def handle_error(e):
     logger.error(f"Unhandled exception: {e}")
@@ -108,5 +139,4 @@ if __name__ == "__main__":
         logger.info("Starting bot in polling mode...")
         await dp.start_polling(bot, skip_updates=True)
     
-    import asyncio
     asyncio.run(main())